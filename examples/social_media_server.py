@@ -1,10 +1,13 @@
 from __future__ import annotations
 
 from datetime import datetime, timedelta
-from typing import Self
+from typing import ClassVar, Self
 
 from pydantic import UUID4, Field
-from sqlmodel import Session
+from sqlalchemy import Index, delete as sql_delete, update as sql_update
+import sqlmodel
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from object_api import (
     App,
     Entity,
@@ -24,54 +27,91 @@ from object_api import (
     servicemethod,
 )
 from object_api.utils.dynamic_default import dynamic_default
+from object_api.utils.request_context import get_entity_cache
+from object_api.utils.sql_types import uuid_field
 
 
 @create_variant()
 @read_variant()
 @update_variant()
-@db_variant(include=["passwd_hash"])
+@db_variant()
 class User(Entity):
     name: str
     birthdate: datetime
 
     class DBModel(Entity.DBModel):
-        passwd_hash: str = Field(exclude=True)
-        login_ids: list[UUID4]
-
-    @property
-    def logins(self) -> list[Login]:
-        return Login.get_by_ids(self.get_db_model().login_ids)
-
-    @property
-    def most_recent_login(self) -> Login:
-        return max(self.logins, key=lambda login: login.timestamp)
+        __tablename__ = "user"
 
-    @property
-    def time_since_last_login(self) -> timedelta:
-        return datetime.now() - self.most_recent_login.timestamp
+        passwd_hash: str = Field(exclude=True)
+        # denormalized from the logins so inactive users can be found without a join
+        last_login_ts: datetime = sqlmodel.Field(
+            default_factory=datetime.now, index=True
+        )
+
+    @dynamic_default("db_session", App.current_read_db_session)
+    async def logins(self, *, db_session: AsyncSession = None) -> list[Login.DBModel]:
+        statement = select(Login.DBModel).where(Login.DBModel.user_id == self.id)
+        return (await db_session.exec(statement)).all()
+
+    @dynamic_default("db_session", App.current_read_db_session)
+    async def most_recent_login(
+        self, *, db_session: AsyncSession = None
+    ) -> Login.DBModel or None:
+        # let the database pick the latest login instead of loading them all
+        statement = (
+            select(Login.DBModel)
+            .where(Login.DBModel.user_id == self.id)
+            .order_by(Login.DBModel.timestamp.desc())
+            .limit(1)
+        )
+        return (await db_session.exec(statement)).first()
+
+    @dynamic_default("db_session", App.current_read_db_session)
+    async def time_since_last_login(
+        self, *, db_session: AsyncSession = None
+    ) -> timedelta:
+        most_recent_login = await self.most_recent_login(db_session=db_session)
+        if most_recent_login is None:
+            return self.age
+        return datetime.now() - most_recent_login.timestamp
 
     @property
     def age(self) -> timedelta:
         return datetime.now() - self.birthdate
 
-    MINIMUM_USER_AGE = Field(timedelta(days=13 * 365.25), exclude=True)
+    MINIMUM_USER_AGE: ClassVar[timedelta] = timedelta(days=13 * 365.25)
 
     @router.post("")
     @dynamic_default("db_session", App.current_db_session)
     @classmethod
-    def create(cls, args: Entity.CreateModel, *, db_session: Session = None) -> Self:
+    async def create(
+        cls, args: Entity.CreateModel, *, db_session: AsyncSession = None
+    ) -> Self:
         if args.birthdate > datetime.now() - cls.MINIMUM_USER_AGE:
             raise ValueError("User is too young to use this service")
-        return super().create(args, db_session=db_session)
+        return await super().create(args, db_session=db_session)
 
-    USER_RETENTION_PERIOD = Field(timedelta(days=365), exclude=True)
+    USER_RETENTION_PERIOD: ClassVar[timedelta] = timedelta(days=365)
 
     @servicemethod(interval=timedelta(days=1))
+    @dynamic_default("db_session", App.current_db_session)
     @classmethod
-    def remove_inactive_users(cls) -> None:
-        for user in cls.objects:
-            if user.time_since_last_login > cls.USER_RETENTION_PERIOD:
-                user.delete()
+    async def remove_inactive_users(cls, *, db_session: AsyncSession = None) -> None:
+        cutoff = datetime.now() - cls.USER_RETENTION_PERIOD
+        inactive = cls.DBModel.last_login_ts < cutoff
+        # the users' logins go in the same transaction, before the users
+        inactive_user_ids = select(cls.DBModel.id).where(inactive)
+        for statement in (
+            sql_delete(Login.DBModel).where(
+                Login.DBModel.user_id.in_(inactive_user_ids)
+            ),
+            sql_delete(cls.DBModel).where(inactive),
+        ):
+            # nothing in the session needs to see the deleted rows go
+            await db_session.execute(
+                statement.execution_options(synchronize_session=False)
+            )
+        await db_session.commit()
 
 
 @create_variant()
@@ -83,9 +123,41 @@ class Login(Entity):
     timestamp: datetime
     token: str
 
-    @property
-    def user(self) -> User:
-        return User.get_by_id(self.user_id)
+    class DBModel(Entity.DBModel):
+        __tablename__ = "login"
+        # serves both user_id lookups and "latest login of a user" queries
+        __table_args__ = (Index("ix_logins_user_ts", "user_id", "timestamp"),)
+
+        user_id: UUID4 = uuid_field(foreign_key="user.id")
+        timestamp: datetime = sqlmodel.Field(index=True)
+
+    async def user(self) -> User:
+        return await User.get_by_id(self.user_id)
+
+    @router.post("")
+    @dynamic_default("db_session", App.current_db_session)
+    @classmethod
+    async def create(
+        cls, args: Entity.CreateModel, *, db_session: AsyncSession = None
+    ) -> Self:
+        login = cls.add_new(args, db_session)
+        # keep the user's denormalized last login timestamp in sync, committed
+        # in the same transaction as the login
+        statement = (
+            sql_update(User.DBModel)
+            .where(User.DBModel.id == login.user_id)
+            .values(last_login_ts=login.timestamp)
+        )
+        await db_session.execute(statement)
+        await db_session.commit()
+        await db_session.refresh(login)
+        # the request may have cached the user row from before the update
+        key = (User.DBModel, login.user_id)
+        if (cache := get_entity_cache()) is not None and key in cache:
+            cache[key] = await db_session.get(
+                User.DBModel, login.user_id, populate_existing=True
+            )
+        return login
 
 
 app = App()
@@ -1,54 +1,121 @@
 from __future__ import annotations
 import asyncio
 
-from contextlib import asynccontextmanager, contextmanager
-from typing import Generator
+from contextlib import asynccontextmanager, contextmanager, suppress
+from contextvars import ContextVar
+from datetime import timedelta
+from functools import cached_property, lru_cache
+import heapq
+import inspect
+import itertools
+import logging
+import time
+from typing import TYPE_CHECKING, AsyncGenerator, Callable, Generator
 from exports import export
 
-from sqlalchemy.future.engine import Engine
-from sqlmodel import SQLModel, Session, create_engine
-from pydantic import Field
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from pydantic import BaseModel, PrivateAttr
 from fastapi import FastAPI
-from scheduler import Scheduler
 
-from object_api.entity import AbstractEntity, Entity
 from object_api.utils.python import subclasses_recursive
-from object_api.utils.request_context import RequestContextMiddleware, get_request_id
+from object_api.utils.dynamic_default import fast_default
+from object_api.utils.request_context import (
+    RequestContextMiddleware,
+    get_request_db_sessions,
+    get_request_id,
+)
 from object_api.utils.has_post_init import HasPostInitMixin
 
 
+SQLITE_URL = "sqlite+aiosqlite:///database.db"
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+    "mmap_size": 268435456,
+}
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+def _create_sqlite_engine(
+    url: str, pool_size: int, max_overflow: int, pool_timeout: float, echo: bool = False
+) -> AsyncEngine:
+    engine = create_async_engine(
+        url,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        echo=echo,
+    )
+    event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+if TYPE_CHECKING:
+    from object_api.entity import Entity
+
+_current_app: ContextVar[App] = ContextVar("current_app")
+
+logger = logging.getLogger(__name__)
+
+
 @export
 class App(FastAPI, HasPostInitMixin):
-    # Class-level semaphore to ensure only one instance is current at a time
-    _semaphore = Field(asyncio.Semaphore(1), init=False, exclude=True)
-    CURRENT_APP: App = Field(None, init=False, exclude=True)
-
-    scheduler: Scheduler = Field(
-        default_factory=lambda: Scheduler(n_threads=0), init=False
+    # (next run on the monotonic clock, tie breaker, interval in seconds, servicemethod)
+    _interval_servicemethods: list[tuple[float, int, float, Callable]] = PrivateAttr(
+        default_factory=list
     )
-    get_entity_classes: list[type[AbstractEntity]] = Field([], init=False)
-    db_engine: Engine = Field(None, init=False)
-    debug: bool = True
-
-    async def __post_init__(self):
-        if not self.db_engine:
-            sqlite_file_name = "database.db"
-            sqlite_url = f"sqlite:///{sqlite_file_name}"
-            connect_args = {"check_same_thread": False}
-            self.db_engine = create_engine(
-                sqlite_url, echo=self.debug, connect_args=connect_args
-            )
+    _interval_servicemethod_counter: itertools.count = PrivateAttr(
+        default_factory=itertools.count
+    )
+    # servicemethod -> tie breaker of its live heap entry
+    _interval_servicemethod_tickets: dict[Callable, int] = PrivateAttr(
+        default_factory=dict
+    )
+    _interval_task: asyncio.Task or None = PrivateAttr(None)
+    # set whenever the schedule changes, waking up the scheduler task
+    _interval_schedule_changed: asyncio.Event = PrivateAttr(
+        default_factory=asyncio.Event
+    )
+    debug: bool = False
+    # log every SQL statement, independent of `debug` since it costs a
+    # logging call per query
+    sql_echo: bool = False
+
+    class Config:
+        keep_untouched = (cached_property,)
 
-        # Wait until the semaphore is available
-        # Create an event loop
-        loop = asyncio.get_event_loop()
-        # Use the loop to run the async function
-        loop.run_until_complete(self._semaphore.acquire())
-        # Close the loop
-        loop.close()
-        # Now set the CURRENT_APP, but do not acquire the semaphore
-        # since this is just something that happens by default
-        self.CURRENT_APP = self
+    def __init__(self, **data):
+        # pydantic takes the App's own fields, FastAPI the remaining kwargs
+        fields = {
+            name: data.pop(name) for name in list(data) if name in self.__fields__
+        }
+        BaseModel.__init__(self, **fields)
+        FastAPI.__init__(self, debug=self.__dict__["debug"], **data)
+        self.__post_init__()
+
+    # FastAPI assigns attributes (and properties) that aren't pydantic fields
+    __setattr__ = object.__setattr__
+
+    def __post_init__(self):
+        # Make this the current app by default (until `as_current` overrides it)
+        _current_app.set(self)
 
         self.add_middleware(RequestContextMiddleware)
         self.build()
@@ -58,73 +125,168 @@ class App(FastAPI, HasPostInitMixin):
 
         return super().__post_init__()
 
+    # sqlite allows a single writer, so writes go through a one-connection
+    # engine (acting as a mutex) while reads share a pooled engine. Both are
+    # created on first use so apps that never touch the db don't pay for them
+    @cached_property
+    def db_engine_rw(self) -> AsyncEngine:
+        # waiting for the single writer connection is bounded like sqlite's
+        # own busy_timeout rather than by the 30s pool default
+        return _create_sqlite_engine(
+            SQLITE_URL,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=SQLITE_PRAGMAS["busy_timeout"] / 1000,
+            echo=self.sql_echo,
+        )
+
+    @cached_property
+    def db_engine_ro(self) -> AsyncEngine:
+        return _create_sqlite_engine(
+            SQLITE_URL,
+            pool_size=10,
+            max_overflow=20,
+            pool_timeout=10,
+            echo=self.sql_echo,
+        )
+
+    # expire_on_commit=False so reading attributes after a commit doesn't
+    # trigger a refetch; autoflush=False so queries don't flush implicitly
+    @cached_property
+    def _session_maker(self) -> sessionmaker:
+        return sessionmaker(
+            bind=self.db_engine_rw,
+            class_=AsyncSession,
+            expire_on_commit=False,
+            autoflush=False,
+        )
+
+    @cached_property
+    def _read_session_maker(self) -> sessionmaker:
+        return sessionmaker(
+            bind=self.db_engine_ro,
+            class_=AsyncSession,
+            expire_on_commit=False,
+            autoflush=False,
+        )
+
     @classmethod
-    def get_entity_classes(cls) -> list[type[Entity]]:
-        return subclasses_recursive(Entity)
+    def CURRENT_APP(cls) -> App or None:
+        return _current_app.get(None)
+
+    @classmethod
+    @lru_cache(maxsize=1)
+    def get_entity_classes(cls) -> tuple[type[Entity], ...]:
+        # cleared by Entity.__init_subclass__ whenever a new entity class is defined
+        from object_api.entity import Entity
+
+        return tuple(subclasses_recursive(Entity))
 
     # The servicemethods will just have to manually pass the session to their invoked service methods
-    _per_thread_active_db_session: dict[str, Session] = Field(None, init=False)
+    _per_thread_active_db_session: dict[tuple[str, bool], AsyncSession] = PrivateAttr(
+        default_factory=dict
+    )
+
+    def get_request_db_session(self, readonly: bool = False) -> AsyncSession or None:
+        """Returns (and possibly creates) the session of the current request,
+        or None outside of a request. RequestContextMiddleware closes it."""
+        sessions = get_request_db_sessions()
+        if sessions is None:
+            return None
+        if (session := sessions.get(readonly)) is None:
+            session_maker = self._read_session_maker if readonly else self._session_maker
+            session = sessions[readonly] = session_maker()
+        return session
 
     @asynccontextmanager
-    async def db_session(self) -> Generator[None, None, None]:
+    async def db_session(
+        self, readonly: bool = False
+    ) -> AsyncGenerator[AsyncSession, None]:
         """Returns (and possibly creates) a session for the current req-response cycle
-        or returns a globally shared session if no request context is available."""
-        req_id = get_request_id() or "global"
-
-        # maybe create or re-initialize the session if its non-existent or inactive
-        if (
-            req_id not in self._per_thread_active_db_session
-            or not self._per_thread_active_db_session[req_id]
-            or not self._per_thread_active_db_session[req_id].is_active
-        ):
-            self._per_thread_active_db_session[req_id] = Session(self.db_engine)
-
-        # now enter the session context or just yield the session if it's already active
-        if self._per_thread_active_db_session[req_id].is_active:
-            yield self._per_thread_active_db_session[req_id]
+        or returns a globally shared session if no request context is available.
+
+        Readonly sessions are bound to the pooled read engine, the others to the
+        single-connection write engine."""
+        if (session := self.get_request_db_session(readonly)) is not None:
+            yield session
             return
-        else:
-            with self._per_thread_active_db_session[req_id] as session:
+
+        key = (get_request_id() or "global", readonly)
+
+        # just yield the session if it's already active
+        session = self._per_thread_active_db_session.get(key)
+        if session is not None and session.is_active:
+            yield session
+            return
+
+        # otherwise create it and own its lifetime
+        session_maker = self._read_session_maker if readonly else self._session_maker
+        session = session_maker()
+        self._per_thread_active_db_session[key] = session
+        try:
+            async with session:
                 yield session
+        finally:
             # make sure to clean up the session after the request is done
-            del self._per_thread_active_db_session[req_id]
-            return
+            del self._per_thread_active_db_session[key]
+
+    @staticmethod
+    def current_request_db_session() -> AsyncSession or None:
+        return (app := App.CURRENT_APP()) and app.get_request_db_session()
+
+    @staticmethod
+    def current_request_read_db_session() -> AsyncSession or None:
+        return (app := App.CURRENT_APP()) and app.get_request_db_session(readonly=True)
 
+    @fast_default(current_request_db_session)
     @asynccontextmanager
     @staticmethod
-    async def current_db_session() -> Generator[Session, None, None]:
-        if not App.CURRENT_APP:
+    async def current_db_session() -> AsyncGenerator[AsyncSession, None]:
+        if not (app := App.CURRENT_APP()):
             raise RuntimeError(
                 "No current app. Please use App.as_current() to set the current app."
             )
 
-        yield App.CURRENT_APP.db_session()
+        async with app.db_session() as session:
+            yield session
 
+    @fast_default(current_request_read_db_session)
     @asynccontextmanager
-    async def as_current(self) -> Generator["App", None, None]:
-        # Wait until the semaphore is available
-        await self._semaphore.acquire()
+    @staticmethod
+    async def current_read_db_session() -> AsyncGenerator[AsyncSession, None]:
+        if not (app := App.CURRENT_APP()):
+            raise RuntimeError(
+                "No current app. Please use App.as_current() to set the current app."
+            )
 
-        # Set this instance as the current app
-        old_app = self.CURRENT_APP
-        self.CURRENT_APP = self
+        async with app.db_session(readonly=True) as session:
+            yield session
 
+    @asynccontextmanager
+    async def as_current(self) -> AsyncGenerator[App, None]:
+        # Set this instance as the current app for the current context only,
+        # so concurrent coroutines using other apps don't block each other
+        token = _current_app.set(self)
         try:
             yield self
         finally:
-            # Restore the previous value and release the semaphore
-            self.CURRENT_APP = old_app
-            self._semaphore.release()
+            _current_app.reset(token)
 
-    _built = Field(False, init=False)
+    _built: bool = PrivateAttr(default=False)
+    _schema_created: bool = PrivateAttr(default=False)
 
     def build(self):
-        self.create_db_and_tables()
         self.build_services()
         self.build_routers()
+        self._built = True
 
-    def create_db_and_tables(self):
-        SQLModel.metadata.create_all(self.db_engine)
+    async def create_db_and_tables(self):
+        # CREATE TABLE IF NOT EXISTS for every table only needs to run once
+        if self._schema_created:
+            return
+        async with self.db_engine_rw.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        self._schema_created = True
 
     def build_services(self):
         for entity_class in self.get_entity_classes():
@@ -133,20 +295,90 @@ class App(FastAPI, HasPostInitMixin):
     def build_routers(self):
         for entity_class in self.get_entity_classes():
             entity_class.build_router()
-            self.mount(entity_class.url_name, entity_class.router)
+            # the router already carries the /{url_name} prefix
+            self.include_router(entity_class.router)
 
-    def start(self):
-        if self._built:
+    async def start(self):
+        await self.create_db_and_tables()
+        if not self._built:
             self.build()
         self.start_services()
+        self._interval_task = asyncio.create_task(self._run_interval_servicemethods())
 
-    def stop(self):
+    async def stop(self):
+        if (interval_task := self._interval_task) is not None:
+            self._interval_task = None
+            interval_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await interval_task
         self.stop_services()
 
+    def schedule_interval_servicemethod(
+        self, servicemethod: Callable, interval: timedelta
+    ):
+        self._push_interval_servicemethod(servicemethod, interval.total_seconds())
+
+    def unschedule_interval_servicemethod(self, servicemethod: Callable):
+        # its heap entries go stale and are dropped when they come up
+        if self._interval_servicemethod_tickets.pop(servicemethod, None) is not None:
+            self._interval_schedule_changed.set()
+
+    def _push_interval_servicemethod(self, servicemethod: Callable, interval: float):
+        ticket = next(self._interval_servicemethod_counter)
+        self._interval_servicemethod_tickets[servicemethod] = ticket
+        heapq.heappush(
+            self._interval_servicemethods,
+            (time.monotonic() + interval, ticket, interval, servicemethod),
+        )
+        self._interval_schedule_changed.set()
+
+    async def _run_interval_servicemethods(self):
+        """Runs every interval servicemethod from a single task, sleeping until
+        the earliest deadline in the heap or until the schedule changes."""
+        heap = self._interval_servicemethods
+        tickets = self._interval_servicemethod_tickets
+        schedule_changed = self._interval_schedule_changed
+        # bound once rather than looked up on every run
+        db_session = self.db_session
+        monotonic = time.monotonic
+        while True:
+            schedule_changed.clear()
+            if not heap:
+                await schedule_changed.wait()
+                continue
+
+            deadline, ticket, interval, servicemethod = heap[0]
+            if tickets.get(servicemethod) != ticket:
+                # unscheduled (or rescheduled) since this entry was pushed
+                heapq.heappop(heap)
+                continue
+            if (delay := deadline - monotonic()) > 0:
+                # an earlier deadline may be pushed while waiting
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(schedule_changed.wait(), delay)
+                continue
+
+            heapq.heappop(heap)
+            try:
+                if inspect.iscoroutinefunction(servicemethod):
+                    # the servicemethod's db calls share this run's session
+                    # instead of each opening their own
+                    async with db_session():
+                        await servicemethod()
+                else:
+                    # unlike run_in_executor, this copies the context (and
+                    # with it the current app) into the worker thread
+                    await asyncio.to_thread(servicemethod)
+            except Exception:
+                logger.exception(f"Interval servicemethod {servicemethod} failed")
+            # unless it was unscheduled while running
+            if tickets.get(servicemethod) == ticket:
+                self._push_interval_servicemethod(servicemethod, interval)
+
     def start_services(self):
         for entity_class in self.get_entity_classes():
-            entity_class.start_services(entity_class)
+            entity_class.start_service(self)
 
     def stop_services(self):
         for entity_class in self.get_entity_classes():
-            entity_class.stop_services(entity_class)
+            entity_class.stop_service(self)
@@ -1,10 +1,24 @@
 from __future__ import annotations
 
 from abc import ABC, ABCMeta, abstractmethod
+from contextlib import asynccontextmanager
+from copy import copy
 from datetime import datetime
 from functools import cache, wraps
 import inspect
-from typing import Annotated, Any, Generic, Self, TypeVar, get_origin
+import textwrap
+from typing import (
+    Annotated,
+    Any,
+    AsyncIterator,
+    ClassVar,
+    Generic,
+    Self,
+    TypeVar,
+    get_args,
+    get_origin,
+    get_type_hints,
+)
 from uuid import UUID
 import uuid
 from exports import export
@@ -12,13 +26,16 @@ import fastapi
 import httpx
 from stringcase import snakecase
 
-from pydantic import UUID4, BaseModel, Field
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select
+from pydantic import UUID4, BaseModel, Field, PrivateAttr
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import delete as sql_delete, update as sql_update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from object_api import router, servicemethod
 from object_api.app import App
 import inspect_mate_pp
 from object_api.utils.errors import InvalidIndexError
+from object_api.utils.request_context import get_entity_cache
 
 from object_api.utils.dynamic_default import dynamic_default
 from object_api.utils.has_post_init import HasPostInitMixin
@@ -32,10 +49,12 @@ from object_api.model_variants import (
     read_variant,
     update_variant,
 )
-from object_api.utils.python import (
-    get_class_dict_attr_generic_types,
-    get_class_list_attr_generic_type,
-)
+
+_ID_PATH = "{id}"
+_GET_BY_IDS_BATCH_SIZE = 500
+# page size for `read_all` when the client doesn't ask for one
+_DEFAULT_PAGE_SIZE = 100
+_MAX_PAGE_SIZE = 1000
 
 
 @export
@@ -44,117 +63,210 @@ from object_api.utils.python import (
 @update_variant(include=[])
 @db_variant(include=["id"])
 class Entity(HasPostInitMixin, BaseModel, ABC):
-    CreateModel: type[CreateModelBase]
-    ReadModel: type[ReadModelBase]
-    UpdateModel: type[UpdateModelBase]
-    DBModel: type[DBModelBase]
-
-    def get_create_model(self) -> CreateModel:
-        return self.CreateModel(**self.get_db_model().dict())
-
-    def get_read_model(self) -> ReadModel:
-        return self.ReadModel(**self.get_db_model().dict())
-
-    def get_update_model(self) -> UpdateModel:
-        return self.UpdateModel(**self.get_db_model().dict())
-
-    def get_db_model(self) -> DBModel:
-        return self.get_by_id(self.id)
+    CreateModel: ClassVar[type[CreateModelBase]]
+    ReadModel: ClassVar[type[ReadModelBase]]
+    UpdateModel: ClassVar[type[UpdateModelBase]]
+    DBModel: ClassVar[type[DBModelBase]]
+
+    # the db model is memoized for as long as the current request's entity cache lives
+    _cached_db_model: tuple[dict, DBModel] or None = PrivateAttr(None)
+
+    async def get_create_model(self) -> CreateModel:
+        return await self._construct_variant(self.CreateModel)
+
+    async def get_read_model(self) -> ReadModel:
+        return await self._construct_variant(self.ReadModel)
+
+    async def get_update_model(self) -> UpdateModel:
+        return await self._construct_variant(self.UpdateModel)
+
+    async def _construct_variant(self, variant: type[BaseModel]) -> BaseModel:
+        # the db model was validated on the way in, so skip re-validating
+        db_model = await self.get_db_model()
+        return variant.construct(**db_model.dict(include=set(variant.__fields__)))
+
+    async def get_db_model(self) -> DBModel:
+        cache = get_entity_cache()
+        if (
+            cache is not None
+            and self._cached_db_model is not None
+            and self._cached_db_model[0] is cache
+        ):
+            return self._cached_db_model[1]
+
+        db_model = await self.get_by_id(self.id)
+        if cache is not None:
+            self._cached_db_model = (cache, db_model)
+        return db_model
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        App.get_entity_classes.cache_clear()
 
     id: UUID4 = Field(default_factory=uuid.uuid4)
 
     @router.post("")
     @dynamic_default("db_session", App.current_db_session)
     @classmethod
-    def create(cls, args: CreateModel, *, db_session: Session = None) -> Self:
-        instance = cls(**args.dict())
+    async def create(cls, args: CreateModel, *, db_session: AsyncSession = None) -> Self:
+        db_instance = cls.add_new(args, db_session)
+        await db_session.commit()
+        await db_session.refresh(db_instance)
+        return db_instance
+
+    @classmethod
+    def add_new(cls, args: CreateModel, db_session: AsyncSession) -> DBModel:
+        """Adds a new row to `db_session` without committing, so overrides of
+        `create` can write more in the same transaction."""
+        # args was validated by fastapi and from_orm validates the row, so
+        # validating the entity in between would only repeat the work
+        instance = cls.construct(**args.dict())
         db_instance = cls.DBModel.from_orm(instance)
         db_session.add(db_instance)
-        db_session.commit()
-        db_session.refresh(db_instance)
         return db_instance
 
-    @dynamic_default("db_session", App.current_db_session)
+    @dynamic_default("db_session", App.current_read_db_session)
     @classmethod
-    def get_by_id(cls, id: UUID4, *, db_session: Session = None) -> DBModel:
-        db_instance = db_session.get(cls.DBModel, id)
+    async def get_by_id(cls, id: UUID4, *, db_session: AsyncSession = None) -> DBModel:
+        # repeated lookups within the same request are served from memory
+        cache = get_entity_cache()
+        key = (cls.DBModel, id)
+        if cache is not None and key in cache:
+            return cache[key]
+
+        db_instance = await db_session.get(cls.DBModel, id)
         if not db_instance:
             raise InvalidIndexError(f"{cls.__name__} with id {id} not found")
+        if cache is not None:
+            cache[key] = db_instance
         return db_instance
 
-    @dynamic_default("db_session", App.current_db_session)
+    def _evict_from_entity_cache(self):
+        self._cached_db_model = None
+        cache = get_entity_cache()
+        if cache is not None:
+            cache.pop((self.DBModel, self.id), None)
+
+    @dynamic_default("db_session", App.current_read_db_session)
     @classmethod
-    def get_by_id_or_none(
-        cls, id: UUID4, *, db_session: Session = None
+    async def get_by_id_or_none(
+        cls, id: UUID4, *, db_session: AsyncSession = None
     ) -> DBModel or None:
         try:
-            return cls.get_by_id(id, db_session=db_session)
+            return await cls.get_by_id(id, db_session=db_session)
         except InvalidIndexError as e:
             return None
 
-    @router.get(f"{{id}}")
-    @dynamic_default("db_session", App.current_db_session)
+    @router.get(_ID_PATH)
+    @dynamic_default("db_session", App.current_read_db_session)
     @classmethod
-    def read_by_id(cls, id: UUID4, *, db_session: Session = None) -> ReadModel:
+    async def read_by_id(
+        cls, id: UUID4, *, db_session: AsyncSession = None
+    ) -> ReadModel:
         try:
-            return cls.get_by_id(id, db_session=db_session)
+            return await cls.get_by_id(id, db_session=db_session)
         except InvalidIndexError:
             raise fastapi.HTTPException(404, f"{cls.__name__} with id {id} not found")
 
-    @dynamic_default("db_session", App.current_db_session)
+    @dynamic_default("db_session", App.current_read_db_session)
     @classmethod
-    def get_by_ids(cls, ids: list[UUID4], *, db_session: Session = None) -> DBModel:
-        statement = select(cls.DBModel).where(cls.DBModel.id.in_(ids))
-        db_instances = db_session.exec(statement).all()
-        if not db_instances:
-            raise InvalidIndexError(f"{cls.__name__} with id {id} not found")
-        return db_instances
+    async def get_by_ids(
+        cls, ids: list[UUID4], *, db_session: AsyncSession = None
+    ) -> AsyncIterator[DBModel]:
+        # query in batches to stay under SQLite's bound parameter limit
+        for start in range(0, len(ids), _GET_BY_IDS_BATCH_SIZE):
+            batch = ids[start : start + _GET_BY_IDS_BATCH_SIZE]
+            statement = select(cls.DBModel).where(cls.DBModel.id.in_(batch))
+            for db_instance in (await db_session.exec(statement)).all():
+                yield db_instance
 
     @router.get()
-    @dynamic_default("db_session", App.current_db_session)
+    @dynamic_default("db_session", App.current_read_db_session)
     @classmethod
-    def read_by_ids(cls, ids: list[UUID4], *, db_session: Session = None) -> ReadModel:
-        try:
-            return cls.get_by_ids(ids, db_session=db_session)
-        except InvalidIndexError:
-            raise fastapi.HTTPException(404, f"{cls.__name__} with id {id} not found")
+    async def read_by_ids(
+        cls, ids: list[UUID4], *, db_session: AsyncSession = None
+    ) -> list[ReadModel]:
+        db_instances = [
+            db_instance
+            async for db_instance in cls.get_by_ids(ids, db_session=db_session)
+        ]
+        if missing_ids := set(ids) - {db_instance.id for db_instance in db_instances}:
+            raise fastapi.HTTPException(
+                404, f"{cls.__name__} with ids {missing_ids} not found"
+            )
+        return db_instances
 
-    @dynamic_default("db_session", App.current_db_session)
+    @dynamic_default("db_session", App.current_read_db_session)
     @classmethod
-    def get_all(
-        cls, offset: int = None, limit: int = None, *, db_session: Session = None
+    async def get_all(
+        cls, offset: int = None, limit: int = None, *, db_session: AsyncSession = None
     ) -> list[DBModel]:
         query = select(cls.DBModel)
-        if offset:
+        if offset is not None:
             query = query.offset(offset)
-        if limit:
+        if limit is not None:
             query = query.limit(limit)
-        return list(db_session.exec(query).all())
+        # `all()` already returns a fresh list
+        return (await db_session.exec(query)).all()
 
     @router.get("")
-    @dynamic_default("db_session", App.current_db_session)
+    @dynamic_default("db_session", App.current_read_db_session)
     @classmethod
-    def read_all(
-        cls, offset: int = None, limit: int = None, *, db_session: Session = None
+    async def read_all(
+        cls,
+        offset: int = None,
+        limit: Annotated[int, Query(ge=1, le=_MAX_PAGE_SIZE)] = _DEFAULT_PAGE_SIZE,
+        *,
+        db_session: AsyncSession = None,
     ) -> list[ReadModel]:
-        return cls.get_all(offset=offset, limit=limit, db_session=db_session)
+        # never hand a whole table to a single request
+        return await cls.get_all(offset=offset, limit=limit, db_session=db_session)
 
     @router.patch()
     @dynamic_default("db_session", App.current_db_session)
-    def update(self, updates: UpdateModel, *, db_session: Session = None) -> ReadModel:
-        for key, value in updates.dict(exclude_unset=True).items():
-            setattr(self, key, value)
-        db_session.add(self.get_db_model())
-        db_session.commit()
-        db_session.refresh(self)
-        return self.get_read_model()
+    async def update(
+        self, updates: UpdateModel, *, db_session: AsyncSession = None
+    ) -> ReadModel:
+        # a single UPDATE instead of fetching, mutating and refreshing the row
+        if values := updates.dict(exclude_unset=True):
+            statement = (
+                sql_update(self.DBModel)
+                .where(self.DBModel.id == self.id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await db_session.execute(statement)
+            await db_session.commit()
+            # mirror the user provided fields on this instance, bypassing
+            # pydantic's __setattr__
+            for name, value in values.items():
+                if name in self.__fields__:
+                    object.__setattr__(self, name, value)
+                    self.__fields_set__.add(name)
+        self._evict_from_entity_cache()
+        if not values:
+            return await self.get_read_model()
+
+        # reload through the session that wrote the row: the read session may
+        # still hold the old row in its identity map or an older snapshot
+        db_model = await db_session.get(self.DBModel, self.id, populate_existing=True)
+        if (cache := get_entity_cache()) is not None:
+            cache[(self.DBModel, self.id)] = db_model
+            self._cached_db_model = (cache, db_model)
+        return self.ReadModel.construct(
+            **db_model.dict(include=set(self.ReadModel.__fields__))
+        )
 
     @router.post("delete")
     @router.delete("")
     @dynamic_default("db_session", App.current_db_session)
-    def delete(self, *, db_session: Session = None) -> None:
-        db_session.delete(self)
-        db_session.commit()
+    async def delete(self, *, db_session: AsyncSession = None) -> dict:
+        # delete the row by id; `self` isn't the mapped instance (and a fetched
+        # one would be bound to the read session)
+        statement = sql_delete(self.DBModel).where(self.DBModel.id == self.id)
+        await db_session.execute(statement)
+        await db_session.commit()
+        self._evict_from_entity_cache()
         return {"ok": True}
 
     @classmethod
@@ -170,301 +282,464 @@ class Entity(HasPostInitMixin, BaseModel, ABC):
                 )
 
     @classmethod
-    def start_service(cls):
-        cls.start_servicemethods(cls)
-        cls.start_interval_servicemethod_scheduler(cls)
+    def start_service(cls, app: App):
+        cls.start_servicemethods()
+        cls.start_interval_servicemethod_scheduler(app)
 
     @classmethod
-    def stop_service(cls):
-        cls.stop_servicemethods(cls)
-        cls.stop_interval_servicemethod_scheduler(cls)
+    def stop_service(cls, app: App):
+        cls.stop_servicemethods()
+        cls.stop_interval_servicemethod_scheduler(app)
 
     @classmethod
     def start_servicemethods(cls):
-        for servicemethod in cls.get_startup_servicemethods(cls):
+        for servicemethod in cls.get_startup_servicemethods():
             servicemethod()
 
     @classmethod
     def stop_servicemethods(cls):
-        for servicemethod in cls.get_shutdown_servicemethods(cls):
+        for servicemethod in cls.get_shutdown_servicemethods():
             servicemethod()
 
     @classmethod
-    def start_interval_servicemethod_scheduler(cls):
-        for servicemethod in cls.get_interval_servicemethods(cls):
-            servicemethod_meta: servicemethod = getattr(
-                servicemethod, servicemethod.__dec_name__
-            )
-            servicemethod_meta.app = App.CURRENT_APP
-            servicemethod_meta.last_executed = datetime.now()
-            servicemethod_meta.scheduler_job = App.CURRENT_APP.scheduler.cyclic(
-                servicemethod.__servicemethod_meta__.interval, servicemethod
+    def start_interval_servicemethod_scheduler(cls, app: App):
+        for servicemethod in cls.get_interval_servicemethods():
+            app.schedule_interval_servicemethod(
+                servicemethod, servicemethod.__servicemethod__.interval
             )
 
     @classmethod
-    def stop_interval_servicemethod_scheduler(cls):
-        for servicemethod in cls.get_interval_servicemethods(cls):
-            servicemethod_meta: servicemethod = getattr(
-                servicemethod, servicemethod.__dec_name__
-            )
-            App.CURRENT_APP.scheduler.delete_job(servicemethod_meta.scheduler_job)
+    def stop_interval_servicemethod_scheduler(cls, app: App):
+        for servicemethod in cls.get_interval_servicemethods():
+            app.unschedule_interval_servicemethod(servicemethod)
 
     @classmethod
     @cache
-    def get_servicemethods(cls) -> list[callable]:
-        return servicemethod.all(cls)
+    def get_servicemethods(cls) -> tuple[callable, ...]:
+        return tuple(servicemethod.servicemethod.all(cls))
 
     @classmethod
     @cache
-    def get_startup_servicemethods(cls) -> list[callable]:
-        return filter(
-            lambda servicemethod: servicemethod.__servicemethod__.startup,
-            cls.get_servicemethods(),
-        )
+    def _get_servicemethods_by_kind(cls) -> dict[str, tuple[callable, ...]]:
+        # sort the servicemethods in a single pass, shared by the getters below
+        by_kind = {"startup": [], "shutdown": [], "interval": [], "seed": []}
+        for servicemethod in cls.get_servicemethods():
+            options = servicemethod.__servicemethod__
+            if options.startup:
+                by_kind["startup"].append(servicemethod)
+            if options.shutdown:
+                by_kind["shutdown"].append(servicemethod)
+            if options.interval is not None:
+                by_kind["interval"].append(servicemethod)
+            if options.seed:
+                by_kind["seed"].append(servicemethod)
+        return {kind: tuple(servicemethods) for kind, servicemethods in by_kind.items()}
 
     @classmethod
-    @cache
-    def get_shutdown_servicemethods(cls) -> list[callable]:
-        return filter(
-            lambda servicemethod: servicemethod.__servicemethod__.shutdown,
-            cls.get_servicemethods(),
-        )
+    def get_startup_servicemethods(cls) -> tuple[callable, ...]:
+        return cls._get_servicemethods_by_kind()["startup"]
 
     @classmethod
-    @cache
-    def get_interval_servicemethods(cls) -> list[callable]:
-        return filter(
-            lambda servicemethod: servicemethod.__servicemethod__.interval is not None,
-            cls.get_servicemethods(),
-        )
+    def get_shutdown_servicemethods(cls) -> tuple[callable, ...]:
+        return cls._get_servicemethods_by_kind()["shutdown"]
 
     @classmethod
-    @cache
-    def get_seed_servicemethods(cls) -> list[callable]:
-        return filter(
-            lambda servicemethod: servicemethod.__servicemethod__.seed,
-            cls.get_servicemethods(),
-        )
+    def get_interval_servicemethods(cls) -> tuple[callable, ...]:
+        return cls._get_servicemethods_by_kind()["interval"]
+
+    @classmethod
+    def get_seed_servicemethods(cls) -> tuple[callable, ...]:
+        return cls._get_servicemethods_by_kind()["seed"]
 
-    router: APIRouter = Field(None, init=False)
+    router: ClassVar[APIRouter] = None
 
     @classmethod
+    @cache
     def url_name(cls) -> str:
         return snakecase(cls.__name__).lstrip("_")
 
     @classmethod
     def build_router(cls, prefix=None):
+        # only build once per class (and not just inherit the parent's router)
+        if vars(cls).get("router") is not None:
+            return
+
         entity_name = cls.url_name()
         prefix = f"/{prefix}/{entity_name}" if prefix is not None else f"/{entity_name}"
         cls.router = APIRouter(prefix=prefix)
 
+        list_fields, dict_fields = cls._classify_fields(cls.ReadModel)
+        mutable_list_fields, mutable_dict_fields = cls._classify_fields(cls.UpdateModel)
+
         cls._build_static_and_class_method_routes()
         cls._build_regular_method_routes()
-        cls._build_list_query_routes()
-        cls._build_dict_query_routes()
-        cls._build_list_mutate_routes()
-        cls._build_dict_mutate_routes()
+        cls._build_list_query_routes(list_fields)
+        cls._build_dict_query_routes(dict_fields)
+        cls._build_list_mutate_routes(mutable_list_fields)
+        cls._build_dict_mutate_routes(mutable_dict_fields)
+
+    @classmethod
+    def _classify_fields(
+        cls, model: type[BaseModel]
+    ) -> tuple[dict[str, type], dict[str, tuple[type, type]]]:
+        """Splits the fields of `model` into list fields (attr -> T) and
+        dict fields (attr -> (Tkey, Tvalue)) in a single pass."""
+        list_fields, dict_fields = {}, {}
+        for attr, pydantic_field in model.__fields__.items():
+            # the item types come from the annotation: pydantic keeps field
+            # defaults out of the class namespace
+            outer_type = pydantic_field.outer_type_
+            origin = get_origin(outer_type)
+            if not isinstance(origin, type):
+                continue
+            if issubclass(origin, list):
+                (list_fields[attr],) = get_args(outer_type) or (Any,)
+            elif issubclass(origin, dict):
+                dict_fields[attr] = get_args(outer_type) or (str, Any)
+        return list_fields, dict_fields
 
     @classmethod
     def _build_static_and_class_method_routes(cls):
-        static_methods = inspect_mate_pp.get_static_methods(cls)
-        class_methods = inspect_mate_pp.get_class_methods(cls)
-        for bound_method in static_methods + class_methods:
-            route_meta: router.route
-            if hasattr(bound_method, "__get_route__") and isinstance(
-                route_meta := getattr(bound_method, router.route.__dec_name__),
-                router.route,
-            ):
-                cls.router.api_route(path=route_meta.path)(bound_method)
+        static_methods = _get_static_methods(cls)
+        class_methods = _get_class_methods(cls)
+        for _, method in static_methods + class_methods:
+            for route_meta in _get_route_metas(method):
+                cls.router.add_api_route(
+                    _join_path(route_meta.path),
+                    cls._make_typed_route_handler(method),
+                    methods=[type(route_meta).__name__.upper()],
+                )
 
     @classmethod
     def _build_regular_method_routes(cls):
-        regular_methods = inspect_mate_pp.get_regular_methods(cls)
-        for bound_method in regular_methods:
-            # see if the method has a route_meta: router.route
-            route_meta: router.route
-            if hasattr(bound_method, "__get_route__") and isinstance(
-                route_meta := getattr(bound_method, router.route.__dec_name__),
-                router.route,
-            ):
-                # annotate self with a Annotated[self.__class__, self.__class__.get_by_id]
-                # so that fastapi automatically gets the instance from the db
-                signature = inspect.signature(bound_method)
-                self_arg_name = list(signature.parameters.keys())[0]
-                self_arg_annotation = signature.parameters[self_arg_name].annotation
-                # see if the annotation is empty annotation
-                if self_arg_annotation == inspect._empty:
-                    # if it is, set it to the class itself
-                    self_arg_annotation = cls
-                # now wrap it with a fastapi Depends so that it gets the instance from the db
-                new_self_arg_annotation = Annotated[
-                    self_arg_annotation, Depends(cls.get_by_id)
-                ]
-
-                # now update the exposed signature
-                @wraps(bound_method)
-                def wrapper(*args, **kwargs):
-                    return bound_method(*args, **kwargs)
-
-                wrapper.__signature__ = signature
-                wrapper.__annotations__[self_arg_name] = new_self_arg_annotation
-                # add new_self_arg_annotation to the signature
-                signature.parameters[self_arg_name] = signature.parameters[
-                    self_arg_name
-                ].replace(annotation=new_self_arg_annotation)
-
-                cls.router.api_route(path=route_meta.path)(wrapper)
-
-    @classmethod
-    def _build_list_query_routes(cls):
-        for attr, pydantic_field in cls.ReadModel.__fields__.items():
-            if issubclass(get_origin(pydantic_field.type_), list):
-                # get by index
-                T = get_class_list_attr_generic_type(cls, attr)
-
-                @cls.router.get(f"{attr}/{{index}}")
-                def get_class_attr_list_by_index(index: int) -> T:
-                    return getattr(cls, attr)[index]
-
-                @cls.router.get(f"{{id}}/{attr}/{{index}}")
-                def get_instance_attr_list_by_index(id: UUID4, index: int) -> T:
-                    return getattr(cls.get_by_id(id), attr)[index]
-
-                # get by slice
-                @cls.router.get(f"{attr}/{{start}}:{{stop}}:{{step}}")
-                def get_class__attrlist_by_slice(
-                    start: int, stop: int, step: int
-                ) -> list[T]:
-                    return getattr(cls, attr)[start:stop:step]
-
-                @cls.router.get(f"{{id}}/{attr}/{{start}}:{{stop}}:{{step}}")
-                def get_instance_attr_list_by_slice(
-                    id: UUID4, start: int, stop: int, step: int
-                ) -> list[T]:
-                    return getattr(cls.get_by_id(id), attr)[start:stop:step]
-
-    @classmethod
-    def _build_dict_query_routes(cls):
-        for attr, pydantic_field in cls.ReadModel.__fields__.items():
-            if issubclass(get_origin(pydantic_field.type_), dict):
-                Tkey, Tvalue = get_class_dict_attr_generic_types(cls, attr)
-                # get by key
-
-                @cls.router.get(f"{attr}/{{key}}")
-                def get_class_attr_dict_by_key(key: Tkey) -> Tvalue:
-                    return getattr(cls, attr)[key]
-
-                @cls.router.get(f"{{id}}/{attr}/{{key}}")
-                def get_instance_attr_dict_by_key(id: UUID4, key: Tkey) -> Tvalue:
-                    return getattr(cls.get_by_id(id), attr)[key]
-
-    @classmethod
-    def _build_list_mutate_routes(cls):
-        for attr, pydantic_field in cls.UpdateModel.__fields__.items():
-            if issubclass(get_origin(pydantic_field.type_), list):
-                T = get_class_list_attr_generic_type(cls, attr)
-
-                # set by index
-                @cls.router.post(f"{attr}/{{index}}")
-                def set_class_attr_list_by_index(index: int, value: T):
-                    getattr(cls, attr)[index] = value
-
-                @cls.router.post(f"{{id}}/{attr}/{{index}}")
-                def set_instance_attr_list_by_index(id: UUID4, index: int, value: T):
-                    getattr(cls.get_by_id(id), attr)[index] = value
-
-                # set by slice
-                @cls.router.post(f"{attr}/{{start}}:{{stop}}:{{step}}")
-                def set_class_attr_list_by_slice(
-                    start: int, stop: int, step: int, value: T
-                ):
-                    getattr(cls, attr)[start:stop:step] = value
-
-                @cls.router.post(f"{{id}}/{attr}/{{start}}:{{stop}}:{{step}}")
-                def set_instance_attr_list_by_slice(
-                    id: UUID4, start: int, stop: int, step: int, values: list[T]
-                ):
-                    getattr(cls.get_by_id(id), attr)[start:stop:step] = values
-
-                # append
-                @cls.router.put(f"{attr}/")
-                @cls.router.post(f"{attr}/append")
-                def append_to_class_attr_list(value: T):
-                    getattr(cls, attr).append(value)
-
-                @cls.router.put(f"{{id}}/{attr}/")
-                @cls.router.post(f"{{id}}/{attr}/append")
-                def append_to_instance_attr_list(id: UUID4, value: T):
-                    getattr(cls.get_by_id(id), attr).append(value)
-
-                # extend
-                @cls.router.post(f"{attr}/extend")
-                def extend_class_attr_list(values: list[T]):
-                    getattr(cls, attr).extend(values)
-
-                @cls.router.post(f"{{id}}/{attr}/extend")
-                def extend_instance_attr_list(id: UUID4, values: list[T]):
-                    getattr(cls.get_by_id(id), attr).extend(values)
-
-                # insert
-                @cls.router.post(f"{attr}/insert")
-                def insert_into_class_attr_list(index: int, value: T):
-                    getattr(cls, attr).insert(index, value)
-
-                @cls.router.post(f"{{id}}/{attr}/insert")
-                def insert_into_instance_attr_list(id: UUID4, index: int, value: T):
-                    getattr(cls.get_by_id(id), attr).insert(index, value)
-
-                # pop
-                @cls.router.post(f"{attr}/pop")
-                def pop_from_class_attr_list(index: int) -> T:
-                    return getattr(cls, attr).pop(index)
-
-                @cls.router.post(f"{{id}}/{attr}/pop")
-                def pop_from_instance_attr_list(id: UUID4, index: int) -> T:
-                    return getattr(cls.get_by_id(id), attr).pop(index)
-
-                # remove
-                @cls.router.post(f"{attr}/remove")
-                def remove_from_class_attr_list(value: T):
-                    getattr(cls, attr).remove(value)
-
-                @cls.router.post(f"{{id}}/{attr}/remove")
-                def remove_from_instance_attr_list(id: UUID4, value: T):
-                    getattr(cls.get_by_id(id), attr).remove(value)
-
-    @classmethod
-    def _build_dict_mutate_routes(cls):
-        for attr, pydantic_field in cls.ReadModel.__fields__.items():
-            if issubclass(get_origin(pydantic_field.type_), dict):
-                Tkey, Tvalue = get_class_dict_attr_generic_types(cls, attr)
-
-                # set by key
-                @cls.router.api_route(f"{attr}/{{key}}", methods=["put", "post"])
-                def set_instance_attr_dict_by_key(key: Tkey, value: Tvalue):
-                    getattr(cls, attr)[key] = value
-
-                @cls.router.api_route(f"{{id}}/{attr}/{{key}}", methods=["put", "post"])
-                def set_instance_attr_dict_by_key(id: UUID4, key: Tkey, value: Tvalue):
-                    getattr(cls.get_by_id(id), attr)[key] = value
-
-                # pop
-                @cls.router.post(f"{attr}/pop/{{key}}")
-                def pop_from_class_attr_dict(key: Tkey) -> Tvalue:
-                    return getattr(cls, attr).pop(key)
-
-                @cls.router.post(f"{{id}}/{attr}/pop/{{key}}")
-                def pop_from_class_attr_dict(id: UUID4, key: Tkey) -> Tvalue:
-                    return getattr(cls.get_by_id(id), attr).pop(key)
-
-                # clear
-                @cls.router.post(f"{attr}/clear")
-                def clear_class_attr_dict():
-                    getattr(cls, attr).clear()
-
-                @cls.router.post(f"{{id}}/{attr}/clear")
-                def clear_class_attr_dict(id: UUID4):
-                    getattr(cls.get_by_id(id), attr).clear()
+        regular_methods = _get_regular_methods(cls)
+        for _, method in regular_methods:
+            route_metas = _get_route_metas(method)
+            if not route_metas:
+                continue
+            # fastapi loads `self` from the id in the path
+            handler = cls._make_typed_route_handler(method)
+            signature = handler.__signature__
+            self_param, *params = signature.parameters.values()
+            self_annotation = Annotated[cls, Depends(cls._get_route_instance)]
+            handler.__signature__ = signature.replace(
+                parameters=[self_param.replace(annotation=self_annotation), *params]
+            )
+            for route_meta in route_metas:
+                cls.router.add_api_route(
+                    _join_path(_ID_PATH, route_meta.path),
+                    handler,
+                    methods=[type(route_meta).__name__.upper()],
+                )
+
+    @classmethod
+    def _make_typed_route_handler(cls, method: callable) -> callable:
+        """Wraps `method` in a handler whose signature fastapi can read: the
+        annotations are evaluated, with the variant names standing for this
+        class's own. `Self` is sent as the read variant, since fastapi would
+        otherwise clone the entity class as the response model."""
+        handler = _make_route_handler(method)
+        signature = inspect.signature(method)
+        handler.__annotations__ = {
+            name: param.annotation
+            for name, param in signature.parameters.items()
+            if param.annotation is not inspect.Parameter.empty
+        }
+        if signature.return_annotation is not inspect.Signature.empty:
+            handler.__annotations__["return"] = signature.return_annotation
+        type_hints = get_type_hints(
+            handler,
+            localns={
+                "Self": cls.ReadModel,
+                "CreateModel": cls.CreateModel,
+                "ReadModel": cls.ReadModel,
+                "UpdateModel": cls.UpdateModel,
+                "DBModel": cls.DBModel,
+            },
+            include_extras=True,
+        )
+        handler.__signature__ = signature.replace(
+            parameters=[
+                param.replace(annotation=type_hints.get(name, param.annotation))
+                for name, param in signature.parameters.items()
+            ],
+            return_annotation=type_hints.get("return", signature.return_annotation),
+        )
+        return handler
+
+    @classmethod
+    async def _get_route_instance(cls, id: UUID4) -> Self:
+        # the `self` of instance method routes
+        try:
+            db_instance = await cls.get_by_id(id)
+        except InvalidIndexError:
+            raise fastapi.HTTPException(404, f"{cls.__name__} with id {id} not found")
+        return cls.construct(**db_instance.dict(include=set(cls.__fields__)))
+
+    @classmethod
+    def _build_list_query_routes(cls, list_fields: dict[str, type]):
+        for attr, T in list_fields.items():
+            namespace = {"cls": cls, "T": T, "UUID4": UUID4}
+
+            # get by slice (before get by index, whose {index} would match too)
+            cls.router.get(f"/{{id}}/{attr}/{{start}}:{{stop}}:{{step}}")(
+                _compile_route_handler(
+                    f"""
+                    async def get_{attr}_by_slice(
+                        id: UUID4, start: int, stop: int, step: int
+                    ) -> list[T]:
+                        return (await cls._get_route_instance(id)).{attr}[start:stop:step]
+                    """,
+                    namespace,
+                )
+            )
+
+            # get by index
+            cls.router.get(f"/{{id}}/{attr}/{{index}}")(
+                _compile_route_handler(
+                    f"""
+                    async def get_{attr}_by_index(id: UUID4, index: int) -> T:
+                        return (await cls._get_route_instance(id)).{attr}[index]
+                    """,
+                    namespace,
+                )
+            )
+
+    @classmethod
+    def _build_dict_query_routes(cls, dict_fields: dict[str, tuple[type, type]]):
+        for attr, (Tkey, Tvalue) in dict_fields.items():
+            namespace = {"cls": cls, "Tkey": Tkey, "Tvalue": Tvalue, "UUID4": UUID4}
+
+            # get by key
+            cls.router.get(f"/{{id}}/{attr}/{{key}}")(
+                _compile_route_handler(
+                    f"""
+                    async def get_{attr}_by_key(id: UUID4, key: Tkey) -> Tvalue:
+                        return (await cls._get_route_instance(id)).{attr}[key]
+                    """,
+                    namespace,
+                )
+            )
+
+    @classmethod
+    def _build_list_mutate_routes(cls, list_fields: dict[str, type]):
+        for attr, T in list_fields.items():
+            namespace = {"cls": cls, "T": T, "UUID4": UUID4}
+
+            # append
+            append_to_attr_list = _compile_route_handler(
+                f"""
+                async def append_to_{attr}(id: UUID4, value: T):
+                    async with cls._editing_field(id, "{attr}") as {attr}:
+                        {attr}.append(value)
+                """,
+                namespace,
+            )
+            cls.router.put(f"/{{id}}/{attr}/")(append_to_attr_list)
+            cls.router.post(f"/{{id}}/{attr}/append")(append_to_attr_list)
+
+            # extend
+            cls.router.post(f"/{{id}}/{attr}/extend")(
+                _compile_route_handler(
+                    f"""
+                    async def extend_{attr}(id: UUID4, values: list[T]):
+                        async with cls._editing_field(id, "{attr}") as {attr}:
+                            {attr}.extend(values)
+                    """,
+                    namespace,
+                )
+            )
+
+            # insert
+            cls.router.post(f"/{{id}}/{attr}/insert")(
+                _compile_route_handler(
+                    f"""
+                    async def insert_into_{attr}(id: UUID4, index: int, value: T):
+                        async with cls._editing_field(id, "{attr}") as {attr}:
+                            {attr}.insert(index, value)
+                    """,
+                    namespace,
+                )
+            )
+
+            # pop
+            cls.router.post(f"/{{id}}/{attr}/pop")(
+                _compile_route_handler(
+                    f"""
+                    async def pop_from_{attr}(id: UUID4, index: int) -> T:
+                        async with cls._editing_field(id, "{attr}") as {attr}:
+                            return {attr}.pop(index)
+                    """,
+                    namespace,
+                )
+            )
+
+            # remove
+            cls.router.post(f"/{{id}}/{attr}/remove")(
+                _compile_route_handler(
+                    f"""
+                    async def remove_from_{attr}(id: UUID4, value: T):
+                        async with cls._editing_field(id, "{attr}") as {attr}:
+                            {attr}.remove(value)
+                    """,
+                    namespace,
+                )
+            )
+
+            # set by slice
+            cls.router.post(f"/{{id}}/{attr}/{{start}}:{{stop}}:{{step}}")(
+                _compile_route_handler(
+                    f"""
+                    async def set_{attr}_by_slice(
+                        id: UUID4, start: int, stop: int, step: int, values: list[T]
+                    ):
+                        async with cls._editing_field(id, "{attr}") as {attr}:
+                            {attr}[start:stop:step] = values
+                    """,
+                    namespace,
+                )
+            )
+
+            # set by index (after the named routes, which {index} matches too)
+            cls.router.post(f"/{{id}}/{attr}/{{index}}")(
+                _compile_route_handler(
+                    f"""
+                    async def set_{attr}_by_index(id: UUID4, index: int, value: T):
+                        async with cls._editing_field(id, "{attr}") as {attr}:
+                            {attr}[index] = value
+                    """,
+                    namespace,
+                )
+            )
+
+    @classmethod
+    def _build_dict_mutate_routes(cls, dict_fields: dict[str, tuple[type, type]]):
+        for attr, (Tkey, Tvalue) in dict_fields.items():
+            namespace = {"cls": cls, "Tkey": Tkey, "Tvalue": Tvalue, "UUID4": UUID4}
+
+            # pop (before set by key, whose {key} would match "pop" too)
+            cls.router.post(f"/{{id}}/{attr}/pop/{{key}}")(
+                _compile_route_handler(
+                    f"""
+                    async def pop_from_{attr}(id: UUID4, key: Tkey) -> Tvalue:
+                        async with cls._editing_field(id, "{attr}") as {attr}:
+                            return {attr}.pop(key)
+                    """,
+                    namespace,
+                )
+            )
+
+            # clear
+            cls.router.post(f"/{{id}}/{attr}/clear")(
+                _compile_route_handler(
+                    f"""
+                    async def clear_{attr}(id: UUID4):
+                        async with cls._editing_field(id, "{attr}") as {attr}:
+                            {attr}.clear()
+                    """,
+                    namespace,
+                )
+            )
+
+            # set by key
+            cls.router.api_route(f"/{{id}}/{attr}/{{key}}", methods=["PUT", "POST"])(
+                _compile_route_handler(
+                    f"""
+                    async def set_{attr}_by_key(id: UUID4, key: Tkey, value: Tvalue):
+                        async with cls._editing_field(id, "{attr}") as {attr}:
+                            {attr}[key] = value
+                    """,
+                    namespace,
+                )
+            )
+
+    @classmethod
+    @asynccontextmanager
+    async def _editing_field(cls, id: UUID4, attr: str) -> AsyncIterator[Any]:
+        """Yields a copy of a list or dict field of the entity with this id and
+        writes it back with `update` once the block is done with it."""
+        instance = await cls._get_route_instance(id)
+        value = copy(getattr(instance, attr))
+        yield value
+        await instance.update(cls.UpdateModel.construct(**{attr: value}))
+
+
+@cache
+def _get_static_methods(cls: type) -> tuple[tuple[str, callable], ...]:
+    return tuple(inspect_mate_pp.get_static_methods(cls))
+
+
+@cache
+def _get_class_methods(cls: type) -> tuple[tuple[str, callable], ...]:
+    return tuple(inspect_mate_pp.get_class_methods(cls))
+
+
+@cache
+def _get_regular_methods(cls: type) -> tuple[tuple[str, callable], ...]:
+    return tuple(inspect_mate_pp.get_regular_methods(cls))
+
+
+# each route decorator registers the HTTP method it is named after
+_ROUTE_DECORATORS = (
+    router.get,
+    router.post,
+    router.put,
+    router.delete,
+    router.patch,
+    router.head,
+    router.options,
+)
+
+
+def _get_route_metas(method: callable) -> list[router.route]:
+    # stacked route decorators each leave their own marker
+    return [
+        route_meta
+        for route_decorator in _ROUTE_DECORATORS
+        if isinstance(
+            route_meta := getattr(method, route_decorator.__dec_name__, None),
+            route_decorator,
+        )
+    ]
+
+
+def _join_path(*parts: str) -> str:
+    # the router prefix is prepended as is, so each part needs its own slash
+    return "".join(f"/{part}" for part in parts if part)
+
+
+def _make_route_handler(method: callable) -> callable:
+    """Wraps `method` in a handler bound to it when the router is built, so
+    each route calls its own method directly."""
+    # look through decorator wrappers for the function that was defined
+    if inspect.iscoroutinefunction(inspect.unwrap(method)):
+
+        @wraps(method)
+        async def handler(*args, **kwargs):
+            return await method(*args, **kwargs)
+
+    else:
+
+        @wraps(method)
+        def handler(*args, **kwargs):
+            return method(*args, **kwargs)
+
+    return handler
+
+
+def _compile_route_handler(source: str, namespace: dict[str, Any]) -> callable:
+    """Compiles a single (indented) function definition with `namespace` as its globals.
+
+    The attribute name is baked into the source, so the generated handlers don't
+    share a late-bound loop variable and don't need a getattr per call."""
+    handler_namespace = dict(namespace)
+    exec(textwrap.dedent(source), handler_namespace)
+    [handler] = (
+        value
+        for name, value in handler_namespace.items()
+        if name not in namespace and name != "__builtins__"
+    )
+    return handler
 
 
 # TODO: split the base entity in a Entity aspect, a API aspect, and a Service aspect
@@ -1,11 +1,23 @@
-from typing import Any, Generic, Iterable, TypeVar
+from __future__ import annotations
+
+from abc import ABC
+from copy import copy
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Generic, Iterable, TypeVar
+import uuid
+from uuid import UUID
 from exports import export
 
-from pydantic import BaseModel
-from sqlmodel import Field, SQLModel
+from pydantic import BaseModel, create_model
+from pydantic.fields import FieldInfo
+from sqlalchemy import Column
+from sqlmodel import SQLModel
+from stringcase import snakecase
 
-from object_api.entity import AbstractEntity
-from object_api.utils.python import get_in_classes
+from object_api.utils.sql_types import uuid_field
+
+if TYPE_CHECKING:
+    from object_api.entity import Entity as AbstractEntity
 
 T = TypeVar("T")
 
@@ -37,72 +49,133 @@ def make_variant(
     include: Iterable[str] = None,
     exclude: Iterable[str] = None,
 ) -> VariantModelBase:
+    return _make_variant(
+        base,
+        variant_attr_name,
+        variant_type,
+        None if include is None else frozenset(include),
+        None if exclude is None else frozenset(exclude),
+    )
+
+
+@lru_cache(maxsize=None)
+def _make_variant(
+    base,
+    variant_attr_name: str,
+    variant_type: type[VariantModelBase],
+    include: frozenset[str] or None,
+    exclude: frozenset[str] or None,
+) -> VariantModelBase:
+    # the variants of the parent entities; the root entity builds on the
+    # variant type itself
     parent_variants = [
         getattr(v, variant_attr_name)
         for v in base.__bases__
-        if issubclass(v, VariantModelBase)
-    ]
+        if isinstance(getattr(v, variant_attr_name, None), type)
+    ] or [variant_type]
 
-    inherited_variant_fields = set(*(v.__fields__ for v in parent_variants))
-    new_fields = set(base.__fields__)
+    inherited_variant_fields = set().union(
+        *(v.__fields__.keys() for v in parent_variants)
+    )
+    new_fields = base.__fields__.keys() | set()
 
     # then apply the BaseModel.__include_fields__ and BaseModel.__exclude_fields__
-    if hasattr(base, "__include_fields__") and getattr(base, "__include_fields__"):
-        base_include_fields = {k for k, v in base.__include_fields__.items() if v}
-        new_fields = new_fields & base_include_fields
-    if hasattr(base, "__exclude_fields__") and getattr(base, "__exclude_fields__"):
-        base_exclude_fields = {k for k, v in base.__exclude_fields__.items() if v}
-        new_fields = new_fields - base_exclude_fields
-
-    fields: set[str]
-
-    match include, exclude:
-        case None, None:
-            fields = inherited_variant_fields | new_fields
-        case None, _:
-            fields = inherited_variant_fields | new_fields - set(exclude)
-        case _, None:
-            fields = inherited_variant_fields | set(include)
-        case _, _:
-            fields = inherited_variant_fields | set(include) - set(exclude)
-
-    variant_on_base = getattr(base, variant_attr_name)
-    bases = (base, *parent_variants, variant_on_base)
-    field_values = dict()
-    field_types = dict()
-    for field_name in fields:
+    if base_include_fields := getattr(base, "__include_fields__", None):
+        new_fields &= {k for k, v in base_include_fields.items() if v}
+    if base_exclude_fields := getattr(base, "__exclude_fields__", None):
+        new_fields -= {k for k, v in base_exclude_fields.items() if v}
+
+    fields = inherited_variant_fields | (
+        (new_fields if include is None else include) - (exclude or frozenset())
+    )
+
+    # a variant declared in the entity's body (eg, `class DBModel(Entity.DBModel)`)
+    # already derives from the parent variants
+    variant_on_base = vars(base).get(variant_attr_name)
+    bases = (variant_on_base,) if variant_on_base is not None else tuple(parent_variants)
+
+    # collect the values and annotations of all the bases in one pass, with
+    # earlier bases (and subclasses within a base's mro) taking precedence
+    base_values = dict()
+    base_annotations = dict()
+    for class_ in reversed((base, *bases)):
+        for klass in reversed(class_.__mro__):
+            base_values.update(vars(klass))
+            base_annotations.update(vars(klass).get("__annotations__", {}))
+    inherited_fields = {name for class_ in bases for name in class_.__fields__}
+
+    field_definitions = dict()
+    for field_name in fields - inherited_fields:
+        # pydantic keeps the entity's own fields out of its class namespace
+        if (model_field := base.__fields__.get(field_name)) is not None:
+            field_definitions[field_name] = (
+                model_field.annotation,
+                model_field.field_info,
+            )
+            continue
         # if its ben redefined in the base, we'll use the base value
-        value = get_in_classes(bases, field_name)
-        if value:
-            field_values[field_name] = value
-            if isinstance(value, Field):
-                field_types[field_name] = value.type_
-            else:
-                field_types[field_name] = type(value)
-        else:
-            # try to get a type from the annotations
-            type = get_in_classes(bases, f"__annotations__.{field_name}")
-            if type:
-                field_types[field_name] = type
-            else:
-                # this field isn't defined on any of the bases, so it must be invalid
-                raise RuntimeError(
-                    f"Field {field_name} is not defined on any of the bases of {base}"
-                )
-
-    VariantModel = type(
-        variant_attr_name,
-        bases,
-        {
-            "__annotations__": field_types,
-            "__include_fields__": None,
-            "__exclude_fields__": None,
-            **field_values,
-        },
+        value = base_values.get(field_name, ...)
+        annotation = base_annotations.get(field_name)
+        if annotation is None and value is not ... and not isinstance(value, FieldInfo):
+            annotation = type(value)
+        if annotation is None:
+            # this field isn't defined on any of the bases, so it must be invalid
+            raise RuntimeError(
+                f"Field {field_name} is not defined on any of the bases of {base}"
+            )
+        field_definitions[field_name] = (annotation, value)
+
+    cls_kwargs = {}
+    if issubclass(variant_type, DBModelBase):
+        # entities that derive from ABC directly (like Entity) only describe
+        # columns, the others get a table of their own
+        if ABC not in base.__bases__:
+            cls_kwargs["table"] = True
+            if not any(
+                "__tablename__" in vars(klass)
+                for class_ in bases
+                for klass in class_.__mro__
+                if klass is not SQLModel
+            ):
+                bases = (_table_name_mixin(snakecase(base.__name__)), *bases)
+            # pydantic deep copies inherited fields, and the copied columns
+            # lose the hooks that attach their foreign keys to the table
+            for class_ in bases:
+                for name, model_field in class_.__fields__.items():
+                    sa_column = getattr(model_field.field_info, "sa_column", None)
+                    if isinstance(sa_column, Column) and name not in field_definitions:
+                        field_info = copy(model_field.field_info)
+                        field_info.sa_column = sa_column._copy()
+                        field_definitions[name] = (model_field.annotation, field_info)
+        if "id" in fields:
+            # store the primary key as 16 bytes rather than a 36 character
+            # string; every table needs a column object of its own
+            field_definitions["id"] = (
+                UUID,
+                uuid_field(primary_key=True, default_factory=uuid.uuid4),
+            )
+
+    VariantModel = create_model(
+        f"{base.__name__}{variant_attr_name}",
+        __base__=bases,
+        __module__=base.__module__,
+        __cls_kwargs__=cls_kwargs,
+        **field_definitions,
     )
+    VariantModel.__include_fields__ = None
+    VariantModel.__exclude_fields__ = None
     return VariantModel
 
 
+def _table_name_mixin(table_name: str) -> type:
+    # create_model only takes fields, so the table name comes from a base
+    return type(
+        f"{table_name}_table_name",
+        (SQLModel,),
+        {"__tablename__": table_name, "__module__": __name__},
+    )
+
+
 def make_and_attach_variant(
     base,
     variant_attr_name: str,
@@ -120,7 +193,9 @@ def create_variant(
     include: Iterable[str] = None, exclude: Iterable[str] = None
 ) -> VariantModelBase:
     def decorator(base: type[AbstractEntity]) -> type[AbstractEntity]:
-        return make_and_attach_variant(base, CreateModelBase, include, exclude)
+        return make_and_attach_variant(
+            base, "CreateModel", CreateModelBase, include, exclude
+        )
 
     return decorator
 
@@ -130,7 +205,9 @@ def read_variant(
     include: Iterable[str] = None, exclude: Iterable[str] = None
 ) -> VariantModelBase:
     def decorator(base: type[AbstractEntity]) -> type[AbstractEntity]:
-        return make_and_attach_variant(base, ReadModelBase, include, exclude)
+        return make_and_attach_variant(
+            base, "ReadModel", ReadModelBase, include, exclude
+        )
 
     return decorator
 
@@ -140,7 +217,9 @@ def update_variant(
     include: Iterable[str] = None, exclude: Iterable[str] = None
 ) -> VariantModelBase:
     def decorator(base: type[AbstractEntity]) -> type[AbstractEntity]:
-        return make_and_attach_variant(base, UpdateModelBase, include, exclude)
+        return make_and_attach_variant(
+            base, "UpdateModel", UpdateModelBase, include, exclude
+        )
 
     return decorator
 
@@ -150,6 +229,8 @@ def db_variant(
     include: Iterable[str] = None, exclude: Iterable[str] = None
 ) -> VariantModelBase:
     def decorator(base: type[AbstractEntity]) -> type[AbstractEntity]:
-        return make_and_attach_variant(base, DBModelBase, include, exclude)
+        return make_and_attach_variant(
+            base, "DBModel", DBModelBase, include, exclude
+        )
 
     return decorator
@@ -1,4 +1,6 @@
+from dataclasses import dataclass
 from datetime import timedelta
+from typing import ClassVar
 
 from exports import export
 
@@ -6,55 +8,53 @@ from object_api.utils.decorator import decorator
 
 
 @export
+@dataclass(frozen=True, slots=True)
 class route(decorator):
-    __dec_name__: str = "__get_route__"
+    __dec_name__: ClassVar[str] = "__get_route__"
 
     path: str or None = None
 
+    def __post_init__(self):
+        # normalize once here instead of on every router build
+        object.__setattr__(self, "path", self.path or "")
+
 
 @export
+@dataclass(frozen=True, slots=True)
 class get(route):
-    __dec_name__: str = "__get_get__"
-
-    path: str or None = None
+    __dec_name__: ClassVar[str] = "__get_get__"
 
 
 @export
+@dataclass(frozen=True, slots=True)
 class post(route):
-    __dec_name__: str = "__get_post__"
-
-    path: str or None = None
+    __dec_name__: ClassVar[str] = "__get_post__"
 
 
 @export
+@dataclass(frozen=True, slots=True)
 class put(route):
-    __dec_name__: str = "__get_put__"
-
-    path: str or None = None
+    __dec_name__: ClassVar[str] = "__get_put__"
 
 
 @export
+@dataclass(frozen=True, slots=True)
 class delete(route):
-    __dec_name__: str = "__get_delete__"
-
-    path: str or None = None
+    __dec_name__: ClassVar[str] = "__get_delete__"
 
 
+@dataclass(frozen=True, slots=True)
 class patch(route):
-    __dec_name__: str = "__get_patch__"
-
-    path: str or None = None
+    __dec_name__: ClassVar[str] = "__get_patch__"
 
 
 @export
+@dataclass(frozen=True, slots=True)
 class head(route):
-    __dec_name__: str = "__get_head__"
-
-    path: str or None = None
+    __dec_name__: ClassVar[str] = "__get_head__"
 
 
 @export
+@dataclass(frozen=True, slots=True)
 class options(route):
-    __dec_name__: str = "__get_options__"
-
-    path: str or None = None
+    __dec_name__: ClassVar[str] = "__get_options__"
@@ -1,15 +1,32 @@
+from dataclasses import dataclass
 from functools import wraps
-from typing import Any
-from pydantic import BaseModel
+import inspect
+from typing import Any, ClassVar
 
 
-class decorator(BaseModel):
-    __dec_name__: str = "__decorator__"
+# plain slotted dataclasses: decorators only carry metadata, so they don't
+# need pydantic's validation on every construction
+@dataclass(frozen=True, slots=True)
+class decorator:
+    __dec_name__: ClassVar[str] = "__decorator__"
 
     def __call__(self, func: callable):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
+        # decorate the underlying function of class/static methods
+        if isinstance(func, (classmethod, staticmethod)):
+            return type(func)(self(func.__func__))
+
+        # keep coroutine functions recognizable as such
+        if inspect.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                return await func(*args, **kwargs)
+
+        else:
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                return func(*args, **kwargs)
 
         setattr(wrapper, self.__dec_name__, self)
 
@@ -17,9 +34,20 @@ class decorator(BaseModel):
 
     @classmethod
     def all(this_cls, class_: type) -> list:
-        return [
-            getattr(class_, attr)
-            for attr in dir(class_)
-            if hasattr(getattr(class_, attr), this_cls.__dec_name__)
-            and isinstance(getattr(class_, attr), this_cls)
-        ]
+        # walk the class namespaces directly instead of `dir()` plus repeated
+        # getattrs, only binding the attributes that carry the marker
+        marker = this_cls.__dec_name__
+        found = []
+        seen = set()
+        for klass in class_.__mro__:
+            for name, value in vars(klass).items():
+                if name in seen:
+                    continue
+                seen.add(name)
+                # class/static methods keep the marker on their function
+                options = getattr(value, marker, None) or getattr(
+                    getattr(value, "__func__", None), marker, None
+                )
+                if isinstance(options, this_cls):
+                    found.append(getattr(class_, name))
+        return found
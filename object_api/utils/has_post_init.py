@@ -3,8 +3,9 @@ from pydantic import BaseModel
 
 
 class HasPostInitMixin(BaseModel):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.__post_init__()
 
     def __post_init__(self):
         pass
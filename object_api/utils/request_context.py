@@ -1,27 +1,62 @@
 # https://github.com/encode/starlette/issues/420#issue-417901877
 
 from contextvars import ContextVar
-from uuid import uuid4
+import os
 
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
-from starlette.requests import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 
 REQUEST_ID_CTX_KEY = "request_id"
+ENTITY_CACHE_CTX_KEY = "entity_cache"
+DB_SESSIONS_CTX_KEY = "db_sessions"
 
 _request_id_ctx_var: ContextVar[str] = ContextVar(REQUEST_ID_CTX_KEY, default=None)
+# (DBModel, id) -> db instance, only populated inside a request
+_entity_cache: ContextVar[dict] = ContextVar(ENTITY_CACHE_CTX_KEY, default=None)
+# readonly flag -> db session opened during the request, closed when it ends
+_request_db_sessions: ContextVar[dict] = ContextVar(DB_SESSIONS_CTX_KEY, default=None)
 
 
-def get_request_id() -> str:
+def get_request_id(scope: Scope = None) -> str:
+    if scope is not None:
+        if request_id := scope.get("state", {}).get(REQUEST_ID_CTX_KEY):
+            return request_id
     return _request_id_ctx_var.get()
 
 
-class RequestContextMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint):
-        request_id = _request_id_ctx_var.set(str(uuid4()))
+def get_entity_cache() -> dict or None:
+    return _entity_cache.get()
 
-        response = await call_next(request)
 
-        _request_id_ctx_var.reset(request_id)
+def get_request_db_sessions() -> dict or None:
+    return _request_db_sessions.get()
 
-        return response
+
+class RequestContextMiddleware:
+    # pure ASGI middleware: unlike BaseHTTPMiddleware it doesn't spawn a task
+    # per request, so the ContextVar is visible to the endpoint and its deps
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        # only needs to be unique, so skip building and formatting a UUID
+        request_id = os.urandom(16).hex()
+        # also exposed as `request.state.request_id`
+        scope.setdefault("state", {})[REQUEST_ID_CTX_KEY] = request_id
+
+        # in-process clients (eg, httpx's ASGITransport) run the app in the
+        # caller's task, so everything set here is reset afterwards
+        request_id_token = _request_id_ctx_var.set(request_id)
+        entity_cache = _entity_cache.set({})
+        db_sessions = _request_db_sessions.set({})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            for session in _request_db_sessions.get().values():
+                await session.close()
+            _request_db_sessions.reset(db_sessions)
+            _entity_cache.reset(entity_cache)
+            _request_id_ctx_var.reset(request_id_token)
@@ -0,0 +1,48 @@
+import uuid
+
+from sqlalchemy import Column, ForeignKey
+from sqlalchemy.types import LargeBinary, TypeDecorator
+from sqlmodel import Field
+
+
+class UUIDBinary(TypeDecorator):
+    """Stores UUIDs as 16 raw bytes instead of 36 character strings"""
+
+    impl = LargeBinary(16)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if not isinstance(value, uuid.UUID):
+            value = uuid.UUID(str(value))
+        return value.bytes
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return uuid.UUID(bytes=value)
+
+
+def uuid_field(
+    *,
+    primary_key: bool = False,
+    foreign_key: str = None,
+    index: bool = False,
+    nullable: bool = False,
+    **kwargs,
+):
+    """A sqlmodel Field stored as a UUIDBinary column.
+
+    Each call builds a new Column since a Column can only belong to one table."""
+    column_args = [ForeignKey(foreign_key)] if foreign_key else []
+    return Field(
+        sa_column=Column(
+            UUIDBinary,
+            *column_args,
+            primary_key=primary_key,
+            index=index,
+            nullable=nullable,
+        ),
+        **kwargs,
+    )
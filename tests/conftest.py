@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from object_api import App
+from object_api.utils.request_context import RequestContextMiddleware
+
+
+@pytest.fixture(autouse=True)
+def _database_in_tmp_path(tmp_path, monkeypatch):
+    # App keeps its sqlite database in the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture
+def run_with_app():
+    """Runs `test(app)` against a started App and stops it afterwards."""
+
+    def run(test):
+        async def main():
+            app = App()
+            await app.start()
+            try:
+                await test(app)
+            finally:
+                await app.stop()
+
+        asyncio.run(main())
+
+    return run
+
+
+@pytest.fixture
+def run_in_request():
+    """Runs `test()` the way the middleware runs an endpoint."""
+
+    def run(test):
+        async def endpoint(scope, receive, send):
+            await test()
+
+        return RequestContextMiddleware(endpoint)({"type": "http"}, None, None)
+
+    return run
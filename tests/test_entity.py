@@ -0,0 +1,73 @@
+from object_api import (
+    Entity,
+    create_variant,
+    db_variant,
+    read_variant,
+    update_variant,
+)
+import object_api.entity
+from object_api.utils.request_context import get_entity_cache, get_request_id
+
+
+@create_variant()
+@read_variant()
+@update_variant()
+@db_variant()
+class Note(Entity):
+    text: str
+
+
+def test_update_returns_the_new_values(run_with_app, run_in_request):
+    async def test(app):
+        note = await Note.create(Note.CreateModel(text="before"))
+
+        async def request():
+            # keeps the old row in the identity map of the request's read session
+            loaded = await Note.get_by_id(note.id)
+            entity = Note(id=note.id, text=note.text)
+            updated = await entity.update(Note.UpdateModel(text="after"))
+            assert updated.text == "after"
+            assert (await Note.get_by_id(note.id)).text == "after"
+            assert (await entity.get_read_model()).text == "after"
+            assert loaded.id == note.id
+
+        await run_in_request(request)
+
+    run_with_app(test)
+
+
+def test_request_context_does_not_outlive_the_request(run_with_app, run_in_request):
+    async def test(app):
+        note = await Note.create(Note.CreateModel(text="cached"))
+
+        async def request():
+            await Note.get_by_id(note.id)
+            assert get_entity_cache()
+            assert get_request_id()
+
+        await run_in_request(request)
+        assert get_entity_cache() is None
+        assert get_request_id() is None
+
+    run_with_app(test)
+
+
+def test_get_by_ids_spans_batches(monkeypatch, run_with_app):
+    monkeypatch.setattr(object_api.entity, "_GET_BY_IDS_BATCH_SIZE", 2)
+
+    async def test(app):
+        notes = [await Note.create(Note.CreateModel(text=str(i))) for i in range(5)]
+        ids = [note.id for note in notes]
+        found = [note async for note in Note.get_by_ids(ids)]
+        assert {note.id for note in found} == set(ids)
+
+    run_with_app(test)
+
+
+def test_get_all_limit_zero_returns_nothing(run_with_app):
+    async def test(app):
+        await Note.create(Note.CreateModel(text="a"))
+        assert await Note.get_all(limit=0) == []
+        assert len(await Note.get_all(limit=1)) == 1
+
+    run_with_app(test)
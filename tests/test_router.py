@@ -0,0 +1,119 @@
+import inspect
+
+import httpx
+from sqlmodel import JSON, Column, Field
+
+from object_api import (
+    App,
+    Entity,
+    create_variant,
+    db_variant,
+    read_variant,
+    router,
+    update_variant,
+)
+
+
+@create_variant()
+@read_variant()
+@update_variant()
+@db_variant()
+class Memo(Entity):
+    text: str
+
+
+@create_variant()
+@read_variant()
+@update_variant()
+@db_variant()
+class Thing(Entity):
+    tags: list[str] = Field(default_factory=list, sa_column=Column(JSON))
+    scores: dict[str, int] = Field(default_factory=dict, sa_column=Column(JSON))
+
+
+def route_methods(routes) -> set[tuple[str, str]]:
+    return {(route.path, method) for route in routes for method in route.methods or ()}
+
+
+def client(app) -> httpx.AsyncClient:
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+def test_route_path_defaults_to_empty_string():
+    assert router.get().path == ""
+    assert router.post("{id}").path == "{id}"
+
+
+def test_route_decorator_keeps_coroutine_functions_async():
+    @router.get()
+    async def endpoint():
+        pass
+
+    assert inspect.iscoroutinefunction(endpoint)
+    assert isinstance(endpoint.__get_get__, router.get)
+
+
+def test_entity_router_registers_the_crud_routes():
+    Memo.build_router()
+    assert route_methods(Memo.router.routes) == {
+        ("/memo", "POST"),
+        ("/memo", "GET"),
+        ("/memo/{id}", "GET"),
+        ("/memo/{id}", "PATCH"),
+        ("/memo/{id}", "DELETE"),
+        ("/memo/{id}/delete", "POST"),
+    }
+
+
+def test_app_includes_the_entity_routes():
+    # the router is built once per class and included by every app
+    for app in (App(), App()):
+        assert route_methods(app.routes) >= route_methods(Memo.router.routes)
+        assert {"/memo", "/memo/{id}"} <= {route.path for route in app.routes}
+
+
+def test_list_and_dict_fields_are_classified():
+    App()
+    assert Thing._classify_fields(Thing.ReadModel) == (
+        {"tags": str},
+        {"scores": (str, int)},
+    )
+    assert ("/thing/{id}/tags/{index}", "GET") in route_methods(Thing.router.routes)
+
+
+def test_entity_routes_round_trip(run_with_app):
+    async def test(app):
+        async with client(app) as http:
+            created = (await http.post("/memo", json={"text": "a"})).json()
+            path = f"/memo/{created['id']}"
+            assert (await http.get(path)).json() == created
+            updated = await http.patch(path, json={"text": "b"})
+            assert updated.json() == {**created, "text": "b"}
+            assert (await http.delete(path)).status_code == 200
+            assert (await http.get(path)).status_code == 404
+
+    run_with_app(test)
+
+
+def test_list_and_dict_field_routes(run_with_app):
+    async def test(app):
+        async with client(app) as http:
+            body = {"tags": ["a", "b"], "scores": {"x": 1}}
+            path = f"/thing/{(await http.post('/thing', json=body)).json()['id']}"
+            assert (await http.get(f"{path}/tags/1")).json() == "b"
+            assert (await http.get(f"{path}/tags/0:2:1")).json() == ["a", "b"]
+            assert (await http.get(f"{path}/scores/x")).json() == 1
+
+            await http.post(f"{path}/tags/append", params={"value": "c"})
+            await http.post(f"{path}/scores/y", params={"value": 2})
+            popped = await http.post(f"{path}/tags/pop", params={"index": 0})
+            assert popped.json() == "a"
+            thing = (await http.get(path)).json()
+            assert thing["tags"] == ["b", "c"]
+            assert thing["scores"] == {"x": 1, "y": 2}
+
+            # fields belong to instances, so there are no routes without an id
+            assert (await http.get("/thing/tags/0")).status_code == 404
+
+    run_with_app(test)
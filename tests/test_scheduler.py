@@ -0,0 +1,117 @@
+import asyncio
+from datetime import timedelta
+from typing import ClassVar
+
+from object_api import App, Entity, servicemethod
+
+TICK = timedelta(seconds=0.01)
+
+
+class Ticker(Entity):
+    ticks: ClassVar[int] = 0
+
+    @servicemethod(interval=TICK)
+    @classmethod
+    async def tick(cls):
+        Ticker.ticks += 1
+
+
+def test_async_interval_servicemethod_runs(run_with_app):
+    async def test(app):
+        Ticker.ticks = 0
+        await asyncio.sleep(0.1)
+        assert Ticker.ticks > 0
+
+    run_with_app(test)
+
+
+def test_servicemethod_scheduled_after_start_runs(run_with_app):
+    runs = []
+
+    async def job():
+        runs.append(1)
+
+    async def test(app):
+        app.unschedule_interval_servicemethod(Ticker.tick)
+        # the scheduler is idle with nothing scheduled
+        await asyncio.sleep(0.05)
+        app.schedule_interval_servicemethod(job, TICK)
+        await asyncio.sleep(0.1)
+        assert runs
+
+    run_with_app(test)
+
+
+def test_earlier_deadline_wakes_the_scheduler(run_with_app):
+    runs = []
+
+    async def slow():
+        pass
+
+    async def fast():
+        runs.append(1)
+
+    async def test(app):
+        app.schedule_interval_servicemethod(slow, timedelta(hours=1))
+        await asyncio.sleep(0.01)
+        app.schedule_interval_servicemethod(fast, TICK)
+        await asyncio.sleep(0.1)
+        assert runs
+
+    run_with_app(test)
+
+
+def test_unscheduled_while_running_is_not_rescheduled(run_with_app):
+    runs = []
+
+    async def test(app):
+        async def job():
+            runs.append(1)
+            app.unschedule_interval_servicemethod(job)
+
+        app.schedule_interval_servicemethod(job, TICK)
+        await asyncio.sleep(0.1)
+        assert runs == [1]
+
+    run_with_app(test)
+
+
+def test_stop_waits_for_the_scheduler_task():
+    async def main():
+        app = App()
+        await app.start()
+        task = app._interval_task
+        await app.stop()
+        assert task.done()
+        assert app._interval_task is None
+
+    asyncio.run(main())
+
+
+def test_sync_servicemethod_sees_the_current_app(run_with_app):
+    seen = []
+
+    def job():
+        seen.append(App.CURRENT_APP())
+
+    async def test(app):
+        app.schedule_interval_servicemethod(job, TICK)
+        await asyncio.sleep(0.1)
+        assert seen and all(current is app for current in seen)
+
+    run_with_app(test)
+
+
+def test_services_are_scheduled_on_the_started_app():
+    async def main():
+        app = App()
+        # another app became current after this one was created
+        App()
+        await app.start()
+        try:
+            assert Ticker.tick in app._interval_servicemethod_tickets
+        finally:
+            await app.stop()
+        assert Ticker.tick not in app._interval_servicemethod_tickets
+
+    asyncio.run(main())
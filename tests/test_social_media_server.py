@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from sqlmodel import select
+
+from examples.social_media_server import Login, User
+
+
+def new_user(last_login_ts: datetime) -> User.DBModel:
+    return User.DBModel(
+        name="user",
+        birthdate=datetime(2000, 1, 1),
+        passwd_hash="",
+        last_login_ts=last_login_ts,
+    )
+
+
+def test_login_references_its_user():
+    [foreign_key] = Login.DBModel.__table__.foreign_keys
+    assert foreign_key.parent.name == "user_id"
+    assert foreign_key.column.table.name == "user"
+
+
+def test_user_table_stores_the_user_fields():
+    assert {"name", "birthdate", "passwd_hash"} <= set(User.DBModel.__table__.c.keys())
+
+
+def test_remove_inactive_users_removes_their_logins(run_with_app):
+    async def test(app):
+        long_ago = datetime.now() - 2 * User.USER_RETENTION_PERIOD
+        inactive, active = new_user(long_ago), new_user(datetime.now())
+        async with app.db_session() as db_session:
+            db_session.add_all([inactive, active])
+            for user in (inactive, active):
+                db_session.add(
+                    Login.DBModel(
+                        user_id=user.id, timestamp=user.last_login_ts, token=""
+                    )
+                )
+            await db_session.commit()
+
+        await User.remove_inactive_users()
+
+        async with app.db_session(readonly=True) as db_session:
+            user_ids = (await db_session.exec(select(User.DBModel.id))).all()
+            login_user_ids = (
+                await db_session.exec(select(Login.DBModel.user_id))
+            ).all()
+        assert user_ids == [active.id]
+        assert login_user_ids == [active.id]
+
+    run_with_app(test)
+
+
+def test_login_refreshes_the_cached_user(run_with_app, run_in_request):
+    async def test(app):
+        user = new_user(datetime.now() - timedelta(days=1))
+        async with app.db_session() as db_session:
+            db_session.add(user)
+            await db_session.commit()
+
+        async def request():
+            cached = await User.get_by_id(user.id)
+            timestamp = datetime.now()
+            await Login.create(
+                Login.CreateModel(user_id=user.id, timestamp=timestamp, token="")
+            )
+            assert (await User.get_by_id(user.id)).last_login_ts == timestamp
+            assert cached.id == user.id
+
+        await run_in_request(request)
+
+    run_with_app(test)